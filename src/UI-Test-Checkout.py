@@ -6,19 +6,35 @@ Datum: November 2025
 
 import os
 import json
+import base64
+import hashlib
+import subprocess
+import tempfile
+import threading
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Tuple
 
+try:
+    import fcntl  # nur POSIX; unter Windows ohne Dateisperre
+except ImportError:
+    fcntl = None
+
 import requests
 from requests import Response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service as ChromeService
 from webdriver_manager.chrome import ChromeDriverManager
+from webdriver_manager.core.driver_cache import DriverCacheManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 
 
 # -----------------------------------------------------------------------------
@@ -30,6 +46,16 @@ logging.basicConfig(
 )
 
 
+# -----------------------------------------------------------------------------
+# ChromeDriver
+# -----------------------------------------------------------------------------
+@lru_cache(maxsize=1)
+def _driver_path() -> str:
+    # SC_CHROMEDRIVER: vorinstallierter Treiber (z. B. im CI), sonst 7 Tage Cache ohne Versionsabfrage
+    path = os.environ.get("SC_CHROMEDRIVER")
+    return path or ChromeDriverManager(cache_manager=DriverCacheManager(valid_range=7)).install()
+
+
 # -----------------------------------------------------------------------------
 # Konfiguration
 # -----------------------------------------------------------------------------
@@ -46,13 +72,19 @@ class TestConfig:
     MERCHANT_REF: str = "50001234"
     CHECKOUT_TEMPLATE: str = "COT_WD0DE66HN2XWJHW8JM88003YG0NEA2"
 
+    # Browser
+    HEADLESS: bool = os.getenv("HEADLESS", "1").lower() not in ("0", "false", "no")
+    SCREENSHOT_MODE: str = os.getenv("SC_SCREENSHOTS", "on_error").lower()  # always | on_error | never
+    CI: bool = os.getenv("CI", "").lower() in ("1", "true", "yes")
+
     # Testdaten
     CUSTOMER_DATA: dict = None
     CREDIT_CARD: dict = None
 
     # Timeouts
-    IMPLICIT_WAIT: int = 5
+    IMPLICIT_WAIT: int = 0  # keine impliziten Waits, sonst addieren sie sich zu den expliziten
     EXPLICIT_WAIT: int = 20
+    FAST_WAIT: int = 2  # optionale Felder / Fallback-Kandidaten
     REQUEST_TIMEOUT: int = 20
 
     def __post_init__(self) -> None:
@@ -90,17 +122,78 @@ class TestConfig:
             missing.append("SC_GCR/GENERAL_CONTRACT_ID")
         if missing:
             raise RuntimeError(f"Fehlende Konfiguration: {', '.join(missing)}")
+        if self.SCREENSHOT_MODE not in ("always", "on_error", "never"):
+            raise RuntimeError(
+                f"Ungültiger Wert für SC_SCREENSHOTS: {self.SCREENSHOT_MODE!r} (always|on_error|never)"
+            )
+
+
+# -----------------------------------------------------------------------------
+# Token-Cache (dateibasiert, über Testläufe hinweg)
+# -----------------------------------------------------------------------------
+def _token_cache_path(cache_key: str) -> str:
+    digest = hashlib.sha1(cache_key.encode()).hexdigest()
+    return os.path.join(tempfile.gettempdir(), f"sc_token_{digest}.json")
+
+
+def _lock(fh, exclusive: bool) -> None:
+    if fcntl is not None:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+
+def _load_cached_token(cache_key: str) -> Tuple[Optional[str], float]:
+    try:
+        with open(_token_cache_path(cache_key), "r", encoding="utf-8") as fh:
+            _lock(fh, exclusive=False)
+            data = json.load(fh)
+        return data.get("t"), float(data.get("e", 0))
+    except (OSError, ValueError, TypeError, AttributeError):
+        # fehlende oder kaputte Cache-Datei wie Cache-Miss behandeln
+        return None, 0.0
+
+
+def _evict_cached_token(cache_key: str) -> None:
+    try:
+        os.remove(_token_cache_path(cache_key))
+    except OSError:
+        pass
+
+
+def _store_cached_token(cache_key: str, token: str, expires_in: float) -> None:
+    try:
+        fd = os.open(_token_cache_path(cache_key), os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            _lock(fh, exclusive=True)
+            fh.truncate()
+            json.dump({"t": token, "e": time.time() + expires_in - 30}, fh)
+    except OSError as exc:
+        logging.warning("API: Token-Cache nicht schreibbar: %s", exc)
 
 
 # -----------------------------------------------------------------------------
 # API-Client
 # -----------------------------------------------------------------------------
 class ApiClient:
+    PENDING_STATUSES = ("pending", "created", "in_progress")
+
     def __init__(self, config: TestConfig) -> None:
         self.config = config
         self.session = requests.Session()
-        self.session.headers.update({"User-Agent": "checkout-ui-test/1.0"})
+        self.session.headers.update({"User-Agent": "checkout-ui-test/1.0", "Connection": "keep-alive"})
+        # Verbindungspool wiederverwenden; Retries nur für idempotente Requests (urllib3-Default)
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            max_retries=Retry(
+                total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                raise_on_status=False,  # letzte Antwort an _ensure_2xx durchreichen
+            ),
+        )
+        self.session.mount("https://", adapter)
         self.access_token: Optional[str] = None
+        self._token_from_cache = False
+        # Token gehört zu Umgebung und Zugangsdaten, nicht nur zur Client-ID
+        self._token_cache_key = "\n".join((config.API_BASE_URL, config.CLIENT_ID, config.CLIENT_SECRET))
         self.transaction_id: Optional[str] = None
         self.checkout_url: Optional[str] = None
 
@@ -112,7 +205,28 @@ class ApiClient:
                 f"{resp.request.method} {resp.url}\n{resp.text}"
             )
 
+    def _use_token(self, token: str) -> None:
+        self.access_token = token
+        self.session.headers.update({"Authorization": f"Bearer {token}"})
+
+    def _send(self, method: str, url: str, **kwargs) -> Response:
+        resp = self.session.request(method, url, timeout=self.config.REQUEST_TIMEOUT, **kwargs)
+        if resp.status_code == 401 and self._token_from_cache:
+            # Token aus dem Cache wurde widerrufen: verwerfen und einmal neu authentifizieren
+            logging.info("API: Token aus Cache abgelehnt, authentifiziere neu …")
+            _evict_cached_token(self._token_cache_key)
+            self.authenticate()
+            resp = self.session.request(method, url, timeout=self.config.REQUEST_TIMEOUT, **kwargs)
+        return resp
+
     def authenticate(self) -> str:
+        token, expires_at = _load_cached_token(self._token_cache_key)
+        if token and expires_at - time.time() > 60:
+            self._use_token(token)
+            self._token_from_cache = True
+            logging.info("API: Auth OK (Token aus Cache)")
+            return token
+
         payload = {
             "grant_type": "client_credentials",
             "client_id": self.config.CLIENT_ID,
@@ -127,12 +241,14 @@ class ApiClient:
         )
         self._ensure_2xx(resp)
 
-        token = resp.json().get("access_token")
+        data = resp.json()
+        token = data.get("access_token")
         if not token:
             raise RuntimeError(f"Kein access_token in Antwort: {resp.text}")
 
-        self.access_token = token
-        self.session.headers.update({"Authorization": f"Bearer {token}"})
+        self._use_token(token)
+        self._token_from_cache = False
+        _store_cached_token(self._token_cache_key, token, float(data.get("expires_in") or 3600))
         logging.info("API: Auth OK")
         return token
 
@@ -183,7 +299,7 @@ class ApiClient:
         headers = {"Content-Type": "application/json"}
 
         logging.info("API: Erzeuge Transaktion …")
-        resp = self.session.post(url, json=payload, headers=headers, timeout=self.config.REQUEST_TIMEOUT)
+        resp = self._send("POST", url, json=payload, headers=headers)
         self._ensure_2xx(resp)
         data = resp.json()
 
@@ -222,42 +338,243 @@ class ApiClient:
         return self.transaction_id, self.checkout_url
 
     def get_transaction_status(self, stx_id: Optional[str] = None) -> dict:
+        """Einzelabfrage; dank Keep-Alive-Session ist wiederholtes Pollen günstig."""
         stx = stx_id or self.transaction_id
         if not stx:
             raise RuntimeError("Keine Transaktion vorhanden")
 
         url = f"{self.config.TRANSACTION_ENDPOINT}{stx}"
-        resp = self.session.get(url, timeout=self.config.REQUEST_TIMEOUT)
+        resp = self._send("GET", url)
         self._ensure_2xx(resp)
         return resp.json()
 
+    @staticmethod
+    def status_of(status_json: dict) -> Optional[str]:
+        return status_json.get("status") or status_json.get("transaction_status")
+
+    def poll_transaction_status(self, stx_id: str, ui_done: threading.Event,
+                                interval: float = 0.5, grace_polls: int = 10) -> dict:
+        """Pollt bis zu einem finalen Status; nach ui_done höchstens grace_polls weitere Abfragen."""
+        remaining = grace_polls
+        status_json: Optional[dict] = None
+        last_error: Optional[Exception] = None
+        while True:
+            try:
+                status_json = self.get_transaction_status(stx_id)
+                status = self.status_of(status_json)
+                if status and status.lower() not in self.PENDING_STATUSES:
+                    return status_json
+            except Exception as exc:
+                # einzelne Fehlabfragen (Timeout, Non-2xx) beenden das Polling nicht
+                logging.warning("API: Statusabfrage fehlgeschlagen: %s", exc)
+                last_error = exc
+            if ui_done.is_set():
+                remaining -= 1
+                if remaining <= 0:
+                    break
+            time.sleep(interval)
+
+        if status_json is None:
+            raise last_error or RuntimeError("Kein Transaktionsstatus erhalten")
+        return status_json
+
 
 # -----------------------------------------------------------------------------
 # Page Object: Checkout
 # -----------------------------------------------------------------------------
+# Datenschlüssel -> (Label-Kandidaten, Attribut-Keywords, Log-Label)
+CUSTOMER_FIELDS = {
+    "email": (["E-Mail", "E-Mail-Adresse", "Email", "E-Mail *"], ["e-mail", "email"], "E-Mail"),
+    "first_name": (["Vorname"], ["vorname", "first"], "Vorname"),
+    "last_name": (["Nachname"], ["nachname", "last"], "Nachname"),
+    "zip_code": (["PLZ", "Postleitzahl"], ["plz", "zip"], "PLZ"),
+    "city": (["Ort", "Stadt"], ["city", "ort"], "Ort"),
+    "street": (["Straße, Hausnummer", "Adresse"], ["street", "adresse"], "Adresse"),
+}
+
+CARD_NUMBER_XP = (
+    "//input[@id='card-number' or @name='cardNumber' or "
+    "contains(@placeholder,'Card number') or contains(@placeholder,'Kartennummer') or "
+    "@inputmode='numeric' or @type='tel']"
+)
+EXPIRY_XP = (
+    "//input[@id='exp-date' or @name='expiry' or "
+    "contains(@placeholder,'MM') or contains(@placeholder,'Expiry')]"
+)
+CVC_XP = (
+    "//input[@id='cardCvv' or @name='cvc' or "
+    "contains(@placeholder,'CVC') or contains(@placeholder,'CVV')]"
+)
+
+CARD_FILL_JS = """
+const set = (sel, v) => {
+    const el = document.querySelector(sel);
+    if (!(el instanceof HTMLInputElement)) return false;
+    el.focus();
+    Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set.call(el, v);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+    return true;
+};
+return [set(arguments[0], arguments[3]), set(arguments[1], arguments[4]), set(arguments[2], arguments[5])];
+"""
+
+# arguments[0]: {key: [id | null, css | null, value]}; Label-IDs haben Vorrang, CSS nur für Felder ohne Label
+BULK_FILL_JS = """
+const targets = Object.entries(arguments[0]);
+const claimed = new Set();
+for (const [, [id]] of targets) {
+    if (id) { const el = document.getElementById(id); if (el) claimed.add(el); }
+}
+const usable = (el) =>
+    (el instanceof HTMLInputElement || el instanceof HTMLTextAreaElement)
+    && !['hidden', 'password', 'checkbox', 'radio', 'submit', 'button'].includes(el.type)
+    && el.getClientRects().length > 0 && getComputedStyle(el).visibility !== 'hidden'
+    && !el.value;
+const missed = [];
+const filled = new Set();
+for (const [key, [id, sel, value]] of targets) {
+    let el = null;
+    if (id) {
+        const byId = document.getElementById(id);
+        if (byId && usable(byId) && !filled.has(byId)) el = byId;
+    } else if (sel) {
+        el = [...document.querySelectorAll(sel)].find((c) => usable(c) && !claimed.has(c)) || null;
+    }
+    if (!el) { missed.push(key); continue; }
+    claimed.add(el);
+    filled.add(el);
+    const proto = el instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, value);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+}
+return missed;
+"""
+
+
+def _css_by_attrs_keywords(keywords) -> str:
+    return ",".join(
+        f'{tag}[{attr}*="{kw.lower()}" i]'
+        for tag in ("input", "textarea")
+        for attr in ("name", "id", "placeholder", "aria-label")
+        for kw in keywords
+    )
+
+
 class CheckoutPage:
-    def __init__(self, driver: webdriver.Chrome, wait: WebDriverWait) -> None:
+    INPUT_FOLLOW = "self::input or self::textarea"
+    SELECT_FOLLOW = "self::select"
+    SALUTATION_LABELS = ("Anrede", "Titel", "Anrede/Titel")
+    COUNTRY_LABELS = ("Land",)
+
+    def __init__(self, driver: webdriver.Chrome, wait: WebDriverWait, fast_timeout: int) -> None:
         self.driver = driver
         self.wait = wait
+        self._fast_wait = WebDriverWait(driver, fast_timeout)
+        self._locator_cache: dict = {}
 
     def _scroll_into_view(self, el) -> None:
         self.driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
 
-    def _by_label_input(self, label_text: str):
-        xp = f"//label[normalize-space()='{label_text}']"
-        label = self.wait.until(EC.presence_of_element_located((By.XPATH, xp)))
-        for_id = label.get_attribute("for")
-        if for_id:
-            return By.ID, for_id
-        return By.XPATH, f"{xp}/following::*[self::input or self::textarea][1]"
+    def _wait_until_clickable_in_view(self, btn) -> None:
+        try:
+            WebDriverWait(self.driver, 2, poll_frequency=0.05).until(
+                lambda d: btn.is_displayed() and btn.is_enabled() and d.execute_script(
+                    "var r=arguments[0].getBoundingClientRect();"
+                    "return r.top>=0 && r.bottom<=window.innerHeight;", btn
+                )
+            )
+        except TimeoutException:
+            # z. B. hoher Button oder Sticky-Footer: trotzdem klicken wie bisher
+            pass
+
+    def _by_label(self, label_candidates, follow: str, wait: Optional[WebDriverWait] = None):
+        labels = [label_candidates] if isinstance(label_candidates, str) else list(label_candidates)
+        key = (follow, tuple(labels))
+        if key in self._locator_cache:
+            return self._locator_cache[key]
+
+        # Alle Kandidaten in einer Abfrage statt einem Timeout pro Kandidat
+        xp = self._label_xpath(labels)
+        label = (wait or self.wait).until(EC.presence_of_element_located((By.XPATH, xp)))
+        loc = self._label_locator(label, xp, follow)
+        self._locator_cache[key] = loc
+        return loc
 
-    def _by_label_select(self, label_text: str):
-        xp = f"//label[normalize-space()='{label_text}']"
-        label = self.wait.until(EC.presence_of_element_located((By.XPATH, xp)))
+    @staticmethod
+    def _label_locator(label, xp: str, follow: str):
         for_id = label.get_attribute("for")
-        if for_id:
-            return By.ID, for_id
-        return By.XPATH, f"{xp}/following::*[self::select][1]"
+        return (By.ID, for_id) if for_id else (By.XPATH, f"{xp}/following::*[{follow}][1]")
+
+    def _with_label(self, label_candidates, follow: str, action, wait: Optional[WebDriverWait] = None) -> None:
+        """Führt action(locator) für das erste passende Label aus; schlägt das fehl, folgen die übrigen Kandidaten."""
+        labels = [label_candidates] if isinstance(label_candidates, str) else list(label_candidates)
+        key = (follow, tuple(labels))
+        failed = None
+        try:
+            failed = self._by_label(labels, follow, wait)
+            action(failed)
+            return
+        except Exception:
+            self._locator_cache.pop(key, None)
+
+        # Seite ist geladen: übrige Kandidaten ohne Wartezeit nachschlagen
+        for lbl in labels:
+            xp = self._label_xpath([lbl])
+            found = self.driver.find_elements(By.XPATH, xp)
+            if not found:
+                continue
+            loc = self._label_locator(found[0], xp, follow)
+            if loc == failed:
+                continue
+            try:
+                action(loc)
+            except Exception:
+                continue
+            self._locator_cache[key] = loc
+            return
+        raise RuntimeError(f"Kein nutzbares Feld für Label {labels}")
+
+    @staticmethod
+    def _label_xpath(labels) -> str:
+        conds = " or ".join(f"normalize-space()='{lbl}'" for lbl in labels)
+        return f"(//label[{conds}])[1]"
+
+    def _with_label_input(self, label_candidates, action, wait: Optional[WebDriverWait] = None) -> None:
+        self._with_label(label_candidates, self.INPUT_FOLLOW, action, wait)
+
+    def _with_label_select(self, label_candidates, action, wait: Optional[WebDriverWait] = None) -> None:
+        self._with_label(label_candidates, self.SELECT_FOLLOW, action, wait)
+
+    def _resolve_labels(self, labels: list) -> dict:
+        return self.driver.execute_script(
+            "const r={};"
+            "const labels=[...document.querySelectorAll('label')];"
+            "for(const l of arguments[0]){"
+            "const el=labels.find(x=>x.textContent.replace(/\\s+/g,' ').trim()===l);"
+            "if(el){r[l]=el.getAttribute('for')||null}}"
+            "return r;", labels
+        ) or {}
+
+    def _prime_label_cache(self, groups_by_follow: dict) -> None:
+        # for-Attribute aller Labels (Inputs und Selects) in einem Roundtrip auflösen und cachen
+        for_ids = self._resolve_labels([
+            lbl for groups in groups_by_follow.values() for group in groups for lbl in group
+        ])
+        for follow, label_groups in groups_by_follow.items():
+            self._cache_label_groups(follow, label_groups, for_ids)
+
+    def _cache_label_groups(self, follow: str, label_groups, for_ids: dict) -> None:
+        for group in label_groups:
+            found = [lbl for lbl in group if lbl in for_ids]
+            if not found:
+                continue
+            for_id = next((for_ids[lbl] for lbl in found if for_ids[lbl]), None)
+            self._locator_cache[(follow, tuple(group))] = (
+                (By.ID, for_id) if for_id
+                else (By.XPATH, f"{self._label_xpath(group)}/following::*[{follow}][1]")
+            )
 
     def _enter_text(self, locator, text: str, label: str) -> None:
         el = self.wait.until(EC.visibility_of_element_located(locator))
@@ -266,15 +583,26 @@ class CheckoutPage:
         el.send_keys(text)
         logging.info("UI: %s: %s", label, text)
 
-    def _select_by_text(self, locator, text: str, label: str) -> None:
-        el = self.wait.until(EC.visibility_of_element_located(locator))
+    def _select_by_text(self, locator, text: str, label: str, wait: Optional[WebDriverWait] = None) -> None:
+        wait = wait or self.wait
+        el = wait.until(EC.visibility_of_element_located(locator))
+        # Natives <select>: Option per JS setzen statt alle Optionen über WebDriver auszulesen
+        if self.driver.execute_script(
+            "const s=arguments[0];const t=arguments[1];"
+            "if(!s.options)return false;"
+            "for(const o of s.options){if(o.textContent.trim()===t){"
+            "s.value=o.value;s.dispatchEvent(new Event('change',{bubbles:true}));return true;}}"
+            "return false;", el, text
+        ):
+            logging.info("UI: %s (JS): %s", label, text)
+            return
         try:
             Select(el).select_by_visible_text(text)
             logging.info("UI: %s: %s", label, text)
         except Exception:
             # Custom-Select Fallback
             el.click()
-            opt = self.wait.until(EC.element_to_be_clickable(
+            opt = wait.until(EC.element_to_be_clickable(
                 (By.XPATH, f"//div[@role='option' or self::li][normalize-space()='{text}']")
             ))
             opt.click()
@@ -286,7 +614,7 @@ class CheckoutPage:
             (By.XPATH, f"//*[self::button or self::a][{xp_or}]")
         ))
         self._scroll_into_view(btn)
-        time.sleep(0.2)
+        self._wait_until_clickable_in_view(btn)
         btn.click()
 
     def _click_button_by_type(self, *types: str, timeout: Optional[int] = None):
@@ -306,16 +634,46 @@ class CheckoutPage:
         wait = self.wait if timeout is None else WebDriverWait(self.driver, timeout)
         btn = wait.until(EC.element_to_be_clickable((By.XPATH, xpath)))
         self._scroll_into_view(btn)
-        time.sleep(0.2)
+        self._wait_until_clickable_in_view(btn)
         btn.click()
         return btn
 
-    def _switch_into_iframe_with(self, by, value, timeout: int = 10) -> bool:
+    def _switch_into_iframe_with(self, by, value, timeout: int = 2) -> bool:
         self.driver.switch_to.default_content()
-        iframes = self.driver.find_elements(By.TAG_NAME, "iframe")
-        for f in iframes:
+        # Ohne impliziten Wait: erst warten, bis ein iframe oder das Zielfeld selbst da ist
+        try:
+            self.wait.until(EC.any_of(
+                EC.presence_of_element_located((By.TAG_NAME, "iframe")),
+                EC.presence_of_element_located((by, value)),
+            ))
+        except TimeoutException:
+            return False
+
+        frames_info = self.driver.execute_script(
+            "return Array.from(document.querySelectorAll('iframe'))"
+            ".map(f=>({el:f, src:f.src||''}));"
+        ) or []
+
+        # Zahlungs-iframe direkt anspringen, statt alle Frames nacheinander zu prüfen
+        tried = None
+        for info in frames_info:
+            src = info["src"].lower()
+            if "secupay" in src or "checkout" in src:
+                tried = info
+                self.driver.switch_to.frame(info["el"])
+                try:
+                    # Gezielter Frame: volle Wartezeit, das Widget rendert die Felder evtl. verzögert
+                    self.wait.until(EC.visibility_of_element_located((by, value)))
+                    return True
+                except Exception:
+                    self.driver.switch_to.default_content()
+                break
+
+        for info in frames_info:
+            if info is tried:
+                continue
             self.driver.switch_to.default_content()
-            self.driver.switch_to.frame(f)
+            self.driver.switch_to.frame(info["el"])
             try:
                 WebDriverWait(self.driver, timeout).until(EC.visibility_of_element_located((by, value)))
                 return True
@@ -328,31 +686,17 @@ class CheckoutPage:
         self.driver.switch_to.default_content()
 
     def _input_by_attrs_keywords(self, keywords):
-        def tr(s):
-            return f"translate({s}, 'ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÜ', 'abcdefghijklmnopqrstuvwxyzäöü')"
-
-        conds = []
-        for attr in ["name", "id", "placeholder", "aria-label"]:
-            for kw in keywords:
-                conds.append(f"contains({tr('@'+attr)}, '{kw.lower()}')")
-        kw_xpath = " or ".join(conds)
-        xp = f"//input[{kw_xpath}] | //textarea[{kw_xpath}]"
-        return By.XPATH, xp
-
-    def _enter_any(self, label_candidates, attr_keywords, value: str, label: str) -> None:
+        return By.CSS_SELECTOR, _css_by_attrs_keywords(keywords)
+
+    def _enter_any(self, label_candidates, attr_keywords, value: str, label: str,
+                   label_wait: Optional[WebDriverWait] = None) -> None:
         try:
-            loc = self._by_label_input(next(iter(label_candidates)))
-            self._enter_text(loc, value, f"{label} (Label)")
+            self._with_label_input(
+                label_candidates, lambda loc: self._enter_text(loc, value, f"{label} (Label)"), label_wait
+            )
             return
         except Exception:
             pass
-        for lbl in label_candidates:
-            try:
-                loc = self._by_label_input(lbl)
-                self._enter_text(loc, value, f"{label} (Label)")
-                return
-            except Exception:
-                continue
         try:
             loc = self._input_by_attrs_keywords(attr_keywords)
             self._enter_text(loc, value, f"{label} (Attr)")
@@ -360,11 +704,8 @@ class CheckoutPage:
         except Exception:
             pass
         try:
-            def tr(s):
-                return f"translate({s}, 'ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÜ', 'abcdefghijklmnopqrstuvwxyzäöü')"
-            kw_text = " or ".join([f"contains({tr('@aria-label')}, '{k.lower()}')" for k in attr_keywords])
-            xp = f"//*[@contenteditable='true' and ({kw_text})]"
-            el = self.wait.until(EC.visibility_of_element_located((By.XPATH, xp)))
+            css = ",".join(f'[contenteditable="true"][aria-label*="{k.lower()}" i]' for k in attr_keywords)
+            el = self.wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, css)))
             self._scroll_into_view(el)
             el.click()
             el.send_keys(value)
@@ -375,6 +716,27 @@ class CheckoutPage:
 
         raise RuntimeError(f"{label}: kein passendes Feld gefunden")
 
+    def bulk_fill(self, field_map: dict) -> list:
+        """Füllt Felder aus CUSTOMER_FIELDS in einem execute_script; gibt nicht gefüllte Schlüssel zurück.
+
+        Ziel ist die per Label aufgelöste ID (siehe _prime_label_cache); Attribut-Selektoren
+        nur für Felder ohne Label. Labels ohne for-Attribut bleiben dem _enter_any-Fallback überlassen.
+        """
+        args = {}
+        for key, value in field_map.items():
+            label_candidates, attr_keywords, _ = CUSTOMER_FIELDS[key]
+            loc = self._locator_cache.get((self.INPUT_FOLLOW, tuple(label_candidates)))
+            if loc is None:
+                args[key] = [None, _css_by_attrs_keywords(attr_keywords), value]
+            elif loc[0] == By.ID:
+                args[key] = [loc[1], None, value]
+        missed = list(self.driver.execute_script(BULK_FILL_JS, args) or [])
+        missed += [key for key in field_map if key not in args]
+        for key, value in field_map.items():
+            if key not in missed:
+                logging.info("UI: %s (JS): %s", CUSTOMER_FIELDS[key][2], value)
+        return missed
+
     def wait_for_customer_form(self) -> None:
         logging.info("UI: Warte auf Kundendaten-Formular …")
         self.wait.until(EC.presence_of_element_located((
@@ -386,33 +748,34 @@ class CheckoutPage:
     def fill_customer_data(self, data: dict) -> None:
         logging.info("UI: Fülle Kundendaten …")
 
-        self._enter_any(
-            label_candidates=["E-Mail", "E-Mail-Adresse", "Email", "E-Mail *"],
-            attr_keywords=["e-mail", "email"],
-            value=data["email"], label="E-Mail"
-        )
+        # Ein Roundtrip liefert die Ziel-IDs für bulk_fill und die Select-Locators
+        self._prime_label_cache({
+            self.INPUT_FOLLOW: [spec[0] for spec in CUSTOMER_FIELDS.values()],
+            self.SELECT_FOLLOW: [self.SALUTATION_LABELS, self.COUNTRY_LABELS],
+        })
+
+        fields = {key: data[key] for key in CUSTOMER_FIELDS}
+        for key in self.bulk_fill(fields):
+            label_candidates, attr_keywords, label = CUSTOMER_FIELDS[key]
+            self._enter_any(label_candidates, attr_keywords, fields[key], label, self._fast_wait)
 
         try:
             sal_map = {"mr": "Herr", "ms": "Frau"}
-            for lbl in ["Anrede", "Titel", "Anrede/Titel"]:
-                try:
-                    sel_loc = self._by_label_select(lbl)
-                    self._select_by_text(sel_loc, sal_map.get(data.get("salutation", ""), data.get("salutation", "")), "Anrede")
-                    break
-                except Exception:
-                    continue
+            salutation = sal_map.get(data.get("salutation", ""), data.get("salutation", ""))
+            self._with_label_select(
+                self.SALUTATION_LABELS,
+                lambda loc: self._select_by_text(loc, salutation, "Anrede", self._fast_wait),
+                self._fast_wait,
+            )
         except Exception:
             pass
 
-        self._enter_any(["Vorname"], ["vorname", "first"], data["first_name"], "Vorname")
-        self._enter_any(["Nachname"], ["nachname", "last"], data["last_name"], "Nachname")
-        self._enter_any(["PLZ", "Postleitzahl"], ["plz", "zip"], data["zip_code"], "PLZ")
-        self._enter_any(["Ort", "Stadt"], ["city", "ort"], data["city"], "Ort")
-        self._enter_any(["Straße, Hausnummer", "Adresse"], ["street", "adresse"], data["street"], "Adresse")
-
         try:
-            sel_loc = self._by_label_select("Land")
-            self._select_by_text(sel_loc, "Deutschland", "Land")
+            self._with_label_select(
+                self.COUNTRY_LABELS,
+                lambda loc: self._select_by_text(loc, "Deutschland", "Land", self._fast_wait),
+                self._fast_wait,
+            )
         except Exception:
             pass
 
@@ -431,31 +794,36 @@ class CheckoutPage:
             value=card["holder"], label="Karteninhaber"
         )
 
-        CARD_NUMBER_XP = (
-            "//input[@id='card-number' or @name='cardNumber' or "
-            "contains(@placeholder,'Card number') or contains(@placeholder,'Kartennummer') or "
-            "@inputmode='numeric' or @type='tel']"
-        )
-        EXPIRY_XP = (
-            "//input[@id='exp-date' or @name='expiry' or "
-            "contains(@placeholder,'MM') or contains(@placeholder,'Expiry')]"
-        )
-        CVC_XP = (
-            "//input[@id='cardCvv' or @name='cvc' or "
-            "contains(@placeholder,'CVC') or contains(@placeholder,'CVV')]"
-        )
-
-        in_iframe = self._switch_into_iframe_with(By.XPATH, CARD_NUMBER_XP, timeout=10)
-
-        self._enter_text((By.XPATH, CARD_NUMBER_XP), card["number"], "Kartennummer")
+        in_iframe = self._switch_into_iframe_with(By.XPATH, CARD_NUMBER_XP)
 
+        expiry = f"{card['expiry_month']}/{card['expiry_year'][-2:]}"
         try:
-            self._enter_text((By.XPATH, EXPIRY_XP), f"{card['expiry_month']}/{card['expiry_year'][-2:]}", "Ablauf (MM/YY)")
+            number_ok, expiry_ok, cvc_ok = self.driver.execute_script(
+                CARD_FILL_JS,
+                "#card-number,[name='cardNumber']", "#exp-date,[name='expiry']", "#cardCvv,[name='cvc']",
+                card["number"], expiry, card["cvv"],
+            ) or (False, False, False)
         except Exception:
-            self._enter_text((By.ID, "exp-date"), card["expiry_month"], "Ablauf Monat")
-            self._enter_text((By.ID, "expiryYear"), card["expiry_year"], "Ablauf Jahr")
+            number_ok, expiry_ok, cvc_ok = False, False, False
 
-        self._enter_text((By.XPATH, CVC_XP), card["cvv"], "CVC")
+        if number_ok:
+            logging.info("UI: Kartennummer (JS): %s", card["number"])
+        else:
+            self._enter_text((By.XPATH, CARD_NUMBER_XP), card["number"], "Kartennummer")
+
+        if expiry_ok:
+            logging.info("UI: Ablauf (MM/YY) (JS): %s", expiry)
+        else:
+            try:
+                self._enter_text((By.XPATH, EXPIRY_XP), expiry, "Ablauf (MM/YY)")
+            except Exception:
+                self._enter_text((By.ID, "exp-date"), card["expiry_month"], "Ablauf Monat")
+                self._enter_text((By.ID, "expiryYear"), card["expiry_year"], "Ablauf Jahr")
+
+        if cvc_ok:
+            logging.info("UI: CVC (JS): %s", card["cvv"])
+        else:
+            self._enter_text((By.XPATH, CVC_XP), card["cvv"], "CVC")
 
         if in_iframe:
             self._leave_iframe()
@@ -471,21 +839,27 @@ class CheckoutPage:
         except Exception:
             self._click_button_by_text("Bezahlen", "Pay", "Zahlung")
 
+    @staticmethod
+    def _classify_result_url(url: str) -> Optional[str]:
+        url = (url or "").upper()
+        if "SUCCESS" in url:
+            return "SUCCESS_URL"
+        if "ERROR" in url:
+            return "ERROR_URL"
+        if "FAILURE" in url or "ABORT" in url:
+            return "FAILURE_URL"
+        return None
+
     def wait_for_result(self, timeout: int = 40) -> str:
         logging.info("UI: Warte auf Ergebnis/Redirect …")
-        end = time.time() + timeout
-        while time.time() < end:
-            url = (self.driver.current_url or "").upper()
-            if "SUCCESS" in url:
-                logging.info("UI: Redirect SUCCESS")
-                return "SUCCESS_URL"
-            if "ERROR" in url:
-                logging.info("UI: Redirect ERROR")
-                return "ERROR_URL"
-            if "FAILURE" in url or "ABORT" in url:
-                logging.info("UI: Redirect FAILURE")
-                return "FAILURE_URL"
-            time.sleep(0.2)
+        try:
+            result = WebDriverWait(self.driver, timeout, poll_frequency=0.5).until(
+                lambda d: self._classify_result_url(d.current_url)
+            )
+            logging.info("UI: Redirect %s", result.removesuffix("_URL"))
+            return result
+        except TimeoutException:
+            pass
         try:
             el = WebDriverWait(self.driver, 5).until(EC.visibility_of_element_located(
                 (By.XPATH, "//*[contains(.,'erfolgreich') or contains(.,'success') or contains(.,'fehlgeschlagen') or contains(.,'failed')]")
@@ -507,49 +881,101 @@ class CheckoutTest:
         self.driver: Optional[webdriver.Chrome] = None
         self.wait: Optional[WebDriverWait] = None
         self.page: Optional[CheckoutPage] = None
+        self._screenshot_pool = ThreadPoolExecutor(max_workers=2)
 
     def setup(self) -> None:
         logging.info("SETUP")
         self.config.validate()
 
+    def _setup_browser(self) -> None:
         options = webdriver.ChromeOptions()
-        options.add_argument("--start-maximized")
+        if self.config.HEADLESS:
+            options.add_argument("--headless=new")
+        options.page_load_strategy = "eager"
+        options.add_argument("--window-size=1920,1080")
         options.add_argument("--disable-notifications")
         options.add_argument("--disable-gpu")
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        for arg in (
+            "--disable-extensions",
+            "--disable-dev-shm-usage",
+            "--disable-background-networking",
+            "--disable-sync",
+            "--disable-translate",
+            "--no-default-browser-check",
+            "--no-first-run",
+            "--log-level=3",
+        ):
+            options.add_argument(arg)
+        if self.config.CI:
+            # Sandbox nur im CI-Container abschalten, nicht bei lokalen Läufen
+            options.add_argument("--no-sandbox")
+        options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
+        options.add_experimental_option("prefs", {
+            "profile.default_content_setting_values.notifications": 2,
+            "profile.managed_default_content_settings.images": 2,
+        })
 
         self.driver = webdriver.Chrome(
-            service=ChromeService(ChromeDriverManager().install()),
+            service=ChromeService(_driver_path(), log_output=subprocess.DEVNULL),
             options=options
         )
         self.driver.implicitly_wait(self.config.IMPLICIT_WAIT)
         self.wait = WebDriverWait(self.driver, self.config.EXPLICIT_WAIT)
-        self.page = CheckoutPage(self.driver, self.wait)
+        self.page = CheckoutPage(self.driver, self.wait, self.config.FAST_WAIT)
 
         logging.info("Browser bereit")
 
+    @staticmethod
+    def _write_png(path: str, png_b64: str) -> None:
+        with open(path, "wb") as fh:
+            fh.write(base64.b64decode(png_b64))
+
+    def _save_screenshot(self, path: str) -> None:
+        # Nur der WebDriver-Aufruf blockiert; Dekodieren und Schreiben laufen im Hintergrund
+        assert self.driver is not None
+        png_b64 = self.driver.get_screenshot_as_base64()
+        future = self._screenshot_pool.submit(self._write_png, path, png_b64)
+        future.add_done_callback(lambda f: self._log_screenshot_error(path, f))
+
+    @staticmethod
+    def _log_screenshot_error(path: str, future) -> None:
+        exc = future.exception()
+        if exc is not None:
+            logging.warning("Screenshot %s nicht schreibbar: %s", path, exc)
+
     def teardown(self) -> None:
         logging.info("TEARDOWN")
-        if self.driver:
-            try:
-                self.driver.quit()
-            finally:
-                logging.info("Browser geschlossen")
+        try:
+            if self.driver:
+                try:
+                    self.driver.quit()
+                finally:
+                    logging.info("Browser geschlossen")
+        finally:
+            self._screenshot_pool.shutdown(wait=True)
 
     def run(self) -> None:
         try:
             self.setup()
 
-            # 1) Auth
-            print("\n" + "=" * 70)
-            print("SCHRITT 1: Authentifizierung")
-            print("=" * 70)
-            self.api.authenticate()
+            # Browserstart läuft parallel zu Auth und Transaktionserzeugung
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                browser_ready = pool.submit(self._setup_browser)
 
-            # 2) Transaktion erzeugen
-            print("\n" + "=" * 70)
-            print("SCHRITT 2: Transaktion erstellen")
-            print("=" * 70)
-            stx_id, checkout_url = self.api.create_transaction()
+                # 1) Auth
+                print("\n" + "=" * 70)
+                print("SCHRITT 1: Authentifizierung")
+                print("=" * 70)
+                self.api.authenticate()
+
+                # 2) Transaktion erzeugen
+                print("\n" + "=" * 70)
+                print("SCHRITT 2: Transaktion erstellen")
+                print("=" * 70)
+                stx_id, checkout_url = self.api.create_transaction()
+
+                browser_ready.result()
 
             # 3) Checkout laden
             print("\n" + "=" * 70)
@@ -566,7 +992,8 @@ class CheckoutTest:
             self.page.wait_for_customer_form()
             self.page.fill_customer_data(self.config.CUSTOMER_DATA)
             self.page.click_continue()
-            self.driver.save_screenshot("02_Kundendaten_ausgefuellt.png")
+            if self.config.SCREENSHOT_MODE == "always":
+                self._save_screenshot("02_Kundendaten_ausgefuellt.png")
 
             # 5) Kreditkartendaten eingeben
             print("\n" + "=" * 70)
@@ -574,7 +1001,8 @@ class CheckoutTest:
             print("=" * 70)
             self.page.fill_credit_card(self.config.CREDIT_CARD)
             self.page.click_continue_to_payment()
-            self.driver.save_screenshot("03_Kreditkarte_ausgefuellt.png")
+            if self.config.SCREENSHOT_MODE == "always":
+                self._save_screenshot("03_Kreditkarte_ausgefuellt.png")
 
             # 6) Submit klicken
             print("\n" + "=" * 70)
@@ -582,26 +1010,31 @@ class CheckoutTest:
             print("=" * 70)
             self.page.click_submit()
 
-            # 7) UI-Ergebnis abwarten
-            print("\n" + "=" * 70)
-            print("SCHRITT 7: Warte auf Ergebnis")
-            print("=" * 70)
-            result = self.page.wait_for_result()
-            logging.info("ERGEBNIS UI: %s", result)
-
-            # 8) API-Status prüfen
-            print("\n" + "=" * 70)
-            print("SCHRITT 8: API-Status prüfen")
-            print("=" * 70)
-            time.sleep(3)
-            status_json = self.api.get_transaction_status(stx_id)
-            status = status_json.get("status") or status_json.get("transaction_status")
-            logging.info("ERGEBNIS API: %s", status)
+            # API-Status wird parallel zum Warten auf den Redirect gepollt
+            ui_done = threading.Event()
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                status_ready = pool.submit(self.api.poll_transaction_status, stx_id, ui_done)
+                try:
+                    # 7) UI-Ergebnis abwarten
+                    print("\n" + "=" * 70)
+                    print("SCHRITT 7: Warte auf Ergebnis")
+                    print("=" * 70)
+                    result = self.page.wait_for_result()
+                    logging.info("ERGEBNIS UI: %s", result)
+                finally:
+                    ui_done.set()
+
+                # 8) API-Status prüfen
+                print("\n" + "=" * 70)
+                print("SCHRITT 8: API-Status prüfen")
+                print("=" * 70)
+                status = self.api.status_of(status_ready.result())
+                logging.info("ERGEBNIS API: %s", status)
 
             assert result in {"SUCCESS_URL", "ERROR_URL", "FAILURE_URL", "UNKNOWN"}
         except Exception as exc:
             logging.error("FEHLER: %s", exc)
-            if self.driver:
+            if self.driver and self.config.SCREENSHOT_MODE != "never":
                 path = f"error_screenshot_{int(time.time())}.png"
                 try:
                     self.driver.save_screenshot(path)